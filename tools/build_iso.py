@@ -5,22 +5,31 @@ Includes CD-DA audio track for music and SPU for sound effects.
 Requires: mkpsxiso
 """
 
+import hashlib
+import os
+import re
 import sys
 import subprocess
 import shutil
+import zipfile
+import zlib
 from pathlib import Path
+from xml.sax.saxutils import escape
 
 PROJECT_ROOT = Path(__file__).parent.parent
 BUILD_DIR = PROJECT_ROOT / "build"
 OUTPUT_DIR = PROJECT_ROOT / "web" / "rom"
 TOOLS_DIR = PROJECT_ROOT / "tools"
 ASSETS_DIR = PROJECT_ROOT / "assets"
+MKPSXISO_CACHE = TOOLS_DIR / ".mkpsxiso_path"
 
-def create_iso_xml(has_audio=False):
+def create_iso_xml(has_audio=False, image_name="lander.bin", cue_sheet="lander.cue"):
     """Create XML for disc with optional CD-DA audio track."""
-    xml = '''<?xml version="1.0" encoding="UTF-8"?>
+    image_name = escape(str(image_name), {'"': "&quot;"})
+    cue_sheet = escape(str(cue_sheet), {'"': "&quot;"})
+    xml = f'''<?xml version="1.0" encoding="UTF-8"?>
 
-<iso_project image_name="lander.bin" cue_sheet="lander.cue">
+<iso_project image_name="{image_name}" cue_sheet="{cue_sheet}">
 \t<track type="data">
 \t\t<directory_tree>
 \t\t\t<file name="SYSTEM.CNF" source="system.cnf"/>
@@ -39,8 +48,24 @@ def create_system_cnf():
     """Create SYSTEM.CNF boot configuration."""
     return "BOOT=cdrom:\\LANDER.EXE;1\nTCB=4\nEVENT=10\nSTACK=801FFFF0\n"
 
-def main():
-    # Find mkpsxiso
+def find_mkpsxiso():
+    """Locate mkpsxiso, remembering the result in tools/.mkpsxiso_path.
+
+    The MKPSXISO environment variable always wins (for CI). Otherwise the
+    cached path is reused while it still exists, and the candidate list is
+    only probed again when it doesn't.
+    """
+    env_path = os.environ.get("MKPSXISO")
+    if env_path:
+        return env_path
+
+    try:
+        cached = MKPSXISO_CACHE.read_text().strip()
+        if cached and Path(cached).exists():
+            return cached
+    except OSError:
+        pass
+
     mkpsxiso = None
     possible_mkpsxiso = [
         PROJECT_ROOT / "web" / "rom" / "PSX Snake Alpha Source Code and Assets" / "Source Code and Assets" / "Source Code" / "mkpsxiso" / "mkpsxiso.exe",
@@ -50,11 +75,64 @@ def main():
     ]
     for p in possible_mkpsxiso:
         if p.exists():
-            mkpsxiso = str(p)
+            mkpsxiso = str(p.resolve())
             break
     if not mkpsxiso:
         mkpsxiso = shutil.which("mkpsxiso")
 
+    if mkpsxiso:
+        try:
+            MKPSXISO_CACHE.write_text(mkpsxiso)
+        except OSError:
+            pass
+    return mkpsxiso
+
+def stage_file(src, dst):
+    """Place src at dst, hard-linking instead of copying when possible."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def zip_compress_type(path, samples=8, sample_size=256 * 1024):
+    """Pick ZIP_DEFLATED or ZIP_STORED for a file by test-compressing samples.
+
+    Reads a few chunks spread across the file and compresses them at level 1.
+    If DEFLATE does not save at least ~3%, storing is just as small and skips
+    the compression pass entirely.
+    """
+    size = path.stat().st_size
+    step = max(size // samples, sample_size)
+    raw = packed = 0
+    with open(path, 'rb') as f:
+        for offset in range(0, size, step):
+            f.seek(offset)
+            chunk = f.read(sample_size)
+            raw += len(chunk)
+            packed += len(zlib.compress(chunk, 1))
+    if raw and packed >= raw * 0.97:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def hash_inputs(paths, *texts):
+    """Return a BLAKE2b digest of the given files' contents and text snippets."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        h.update(b'\0')
+    for text in texts:
+        h.update(text.encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+def main():
+    # Find mkpsxiso
+    mkpsxiso = find_mkpsxiso()
+
     if not mkpsxiso:
         print("ERROR: mkpsxiso not found!")
         sys.exit(1)
@@ -72,7 +150,7 @@ def main():
     work_dir.mkdir(exist_ok=True)
 
     # Copy executable
-    shutil.copy(exe_path, work_dir / "lander.psexe")
+    stage_file(exe_path, work_dir / "lander.psexe")
     exe_size = exe_path.stat().st_size / 1024
     print(f"Executable size: {exe_size:.1f} KB")
 
@@ -80,92 +158,86 @@ def main():
     music_file = ASSETS_DIR / "sefchol_take_it_slow.wav"
     has_audio = music_file.exists()
     if has_audio:
-        shutil.copy(music_file, work_dir / "music.wav")
+        stage_file(music_file, work_dir / "music.wav")
         music_size = music_file.stat().st_size / (1024 * 1024)
         print(f"CD-DA music: {music_size:.1f} MB (SefChol - Take it Slow)")
     else:
         print("No CD-DA music (sefchol_take_it_slow.wav not found)")
 
-    # Create SYSTEM.CNF
-    (work_dir / "system.cnf").write_text(create_system_cnf())
-
-    # Create ISO XML config
-    xml_path = work_dir / "iso.xml"
-    xml_path.write_text(create_iso_xml(has_audio))
-
-    # Run mkpsxiso
-    print("Building disc image...")
-
-    import time
-    timestamp = int(time.time())
-    temp_bin = f"lander_{timestamp}.bin"
-    temp_cue = f"lander_{timestamp}.cue"
-
-    # Update XML to use temp filenames
-    xml_content = xml_path.read_text()
-    xml_content = xml_content.replace('image_name="lander.bin"', f'image_name="{temp_bin}"')
-    xml_content = xml_content.replace('cue_sheet="lander.cue"', f'cue_sheet="{temp_cue}"')
-    xml_path.write_text(xml_content)
-
-    cmd = f'"{mkpsxiso}" iso.xml -y'
-    result = subprocess.run(cmd, cwd=work_dir, capture_output=True, text=True, shell=True)
-
-    if result.returncode != 0:
-        print("ERROR: mkpsxiso failed!")
-        print(result.stdout)
-        print(result.stderr)
-        sys.exit(1)
-
-    # Copy output to web/rom
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    dest_bin = OUTPUT_DIR / "lander.bin"
+    dest_cue = OUTPUT_DIR / "lander.cue"
+    dest_zip = OUTPUT_DIR / "lander.zip"
+
+    # Output paths must be absolute since mkpsxiso runs from work_dir
+    system_cnf = create_system_cnf()
+    iso_xml = create_iso_xml(has_audio, dest_bin.resolve(), dest_cue.resolve())
+
+    # Skip the whole pipeline if nothing that goes into the disc has changed
+    hash_path = work_dir / ".last_hash"
+    # This script is hashed too, so changes to the cue/zip steps invalidate the cache
+    input_files = [Path(__file__), exe_path] + ([music_file] if has_audio else [])
+    input_hash = hash_inputs(input_files, system_cnf, iso_xml)
+    outputs_exist = all(p.exists() for p in [dest_bin, dest_cue, dest_zip])
+    if outputs_exist and hash_path.exists() and hash_path.read_text() == input_hash:
+        print(f"Disc image is up to date: {dest_bin}")
+        print("Done!")
+        return
+    hash_path.unlink(missing_ok=True)
+
+    # Output goes straight to web/rom; make sure an emulator isn't holding it.
+    # The old zip goes too, so a failed build never leaves it next to a
+    # missing bin/cue.
+    for dest in [dest_bin, dest_cue, dest_zip]:
+        if dest.exists():
+            try:
+                dest.unlink()
+            except PermissionError:
+                print(f"ERROR: {dest} is locked!")
+                sys.exit(1)
 
-    bin_path = work_dir / temp_bin
-    cue_path = work_dir / temp_cue
-
-    if bin_path.exists():
-        dest_bin = OUTPUT_DIR / "lander.bin"
-        dest_cue = OUTPUT_DIR / "lander.cue"
-
-        for dest in [dest_bin, dest_cue]:
-            if dest.exists():
-                try:
-                    dest.unlink()
-                except PermissionError:
-                    print(f"ERROR: {dest} is locked!")
-                    sys.exit(1)
-
-        shutil.copy(bin_path, dest_bin)
+    # Create SYSTEM.CNF
+    (work_dir / "system.cnf").write_text(system_cnf)
 
-        cue_content = cue_path.read_text()
-        cue_content = cue_content.replace(temp_bin, "lander.bin")
-        dest_cue.write_text(cue_content)
+    # Create ISO XML config (sources resolve relative to work_dir)
+    (work_dir / "iso.xml").write_text(iso_xml, encoding="utf-8")
 
-        # Clean up
-        try:
-            bin_path.unlink()
-            cue_path.unlink()
-        except:
-            pass
+    # Run mkpsxiso
+    print("Building disc image...", flush=True)
 
-        print(f"Created: {dest_bin}")
-        print(f"Created: {dest_cue}")
+    # No shell and no capture: mkpsxiso's progress goes straight to the console
+    try:
+        subprocess.run([mkpsxiso, "iso.xml", "-y"], cwd=work_dir, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"ERROR: mkpsxiso failed! ({e})")
+        sys.exit(1)
 
-        # Create zip for EmulatorJS
-        import zipfile
-        dest_zip = OUTPUT_DIR / "lander.zip"
-        try:
-            if dest_zip.exists():
-                dest_zip.unlink()
-            with zipfile.ZipFile(dest_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
-                zf.write(dest_bin, "lander.bin")
-                zf.write(dest_cue, "lander.cue")
-            print(f"Created: {dest_zip}")
-        except Exception as e:
-            print(f"Warning: Could not create zip: {e}")
-    else:
+    if not dest_bin.exists():
         print("ERROR: Output files not created")
         sys.exit(1)
 
+    # The cue sheet must reference the image by name, however mkpsxiso wrote the path
+    cue_content = dest_cue.read_text(encoding="utf-8")
+    fixed_cue = re.sub(r'FILE "[^"]*"', 'FILE "lander.bin"', cue_content)
+    if fixed_cue != cue_content:
+        dest_cue.write_text(fixed_cue, encoding="utf-8")
+
+    print(f"Created: {dest_bin}")
+    print(f"Created: {dest_cue}")
+
+    # Create zip for EmulatorJS
+    try:
+        # Fastest DEFLATE level: disc sectors (especially CD-DA audio) barely
+        # compress, so higher levels only add build time for no size gain
+        with zipfile.ZipFile(dest_zip, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            zf.write(dest_bin, "lander.bin", compress_type=zip_compress_type(dest_bin))
+            zf.write(dest_cue, "lander.cue")
+        print(f"Created: {dest_zip}")
+        # Only remember the inputs once every output has been written
+        hash_path.write_text(input_hash)
+    except Exception as e:
+        print(f"Warning: Could not create zip: {e}")
+
     print("Done!")
 
 if __name__ == "__main__":
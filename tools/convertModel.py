@@ -22,27 +22,28 @@ Output format:
 """
 
 import argparse
+import hashlib
 import struct
 import sys
+from itertools import repeat
 from pathlib import Path
 
 
+# Record layouts of the output format (see module docstring)
+HEADER_STRUCT = struct.Struct('<HHHH')
+VERTEX_STRUCT = struct.Struct('<hhhh')   # GTEVector16: x, y, z, padding
+UV_STRUCT = struct.Struct('<BB')
+FACE_STRUCT = struct.Struct('<hhhhhhhhh')  # v0-v3, uv0-uv3, normal index
+
+
 def parse_obj(filepath):
     """Parse OBJ file and return vertices, uvs, and faces."""
     vertices = []
     uvs = []
     faces = []
 
-    # OBJ indices are 1-based, we need to track the base index for each object
-    vertex_offset = 0
-    uv_offset = 0
-
     with open(filepath, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-
+        for line_num, line in enumerate(f, 1):
             parts = line.split()
             if not parts:
                 continue
@@ -50,122 +51,153 @@ def parse_obj(filepath):
             cmd = parts[0]
 
             if cmd == 'v':
-                # Vertex position
-                x, y, z = float(parts[1]), float(parts[2]), float(parts[3])
-                vertices.append((x, y, z))
-
-            elif cmd == 'vt':
-                # Texture coordinate
-                u, v = float(parts[1]), float(parts[2])
-                uvs.append((u, v))
-
-            elif cmd == 'f':
-                # Face - can be triangle or quad
-                face_verts = []
-                face_uvs = []
-
-                for i in range(1, len(parts)):
-                    indices = parts[i].split('/')
-                    v_idx = int(indices[0]) - 1  # Convert to 0-based
-
-                    if len(indices) >= 2 and indices[1]:
-                        uv_idx = int(indices[1]) - 1
-                    else:
-                        uv_idx = 0
-
-                    face_verts.append(v_idx)
-                    face_uvs.append(uv_idx)
-
-                # Handle triangles and quads
-                # Reverse winding order (swap v1/v2) for correct backface culling on PS1
-                if len(face_verts) == 3:
-                    faces.append({
-                        'verts': (face_verts[0], face_verts[2], face_verts[1], -1),
-                        'uvs': (face_uvs[0], face_uvs[2], face_uvs[1], -1)
-                    })
-                elif len(face_verts) == 4:
-                    # Split quad into two triangles (with reversed winding)
-                    faces.append({
-                        'verts': (face_verts[0], face_verts[2], face_verts[1], -1),
-                        'uvs': (face_uvs[0], face_uvs[2], face_uvs[1], -1)
-                    })
-                    faces.append({
-                        'verts': (face_verts[0], face_verts[3], face_verts[2], -1),
-                        'uvs': (face_uvs[0], face_uvs[3], face_uvs[2], -1)
-                    })
-                elif len(face_verts) > 4:
-                    # Triangulate polygon using fan method (with reversed winding)
-                    for i in range(1, len(face_verts) - 1):
-                        faces.append({
-                            'verts': (face_verts[0], face_verts[i+1], face_verts[i], -1),
-                            'uvs': (face_uvs[0], face_uvs[i+1], face_uvs[i], -1)
-                        })
+                # Vertex position; a short line would shift every later index
+                if len(parts) < 4:
+                    raise ValueError(f"{filepath}:{line_num}: malformed vertex: {line.strip()}")
+                vertices.append((float(parts[1]), float(parts[2]), float(parts[3])))
+                continue
+
+            if cmd == 'vt':
+                # Texture coordinate (v is optional and defaults to 0)
+                if len(parts) < 2:
+                    raise ValueError(f"{filepath}:{line_num}: malformed texture coordinate: {line.strip()}")
+                uvs.append((float(parts[1]), float(parts[2]) if len(parts) > 2 else 0.0))
+                continue
+
+            if cmd != 'f':
+                continue
+
+            # Face - can be triangle, quad or polygon
+            # OBJ indices are 1-based, convert to 0-based (missing UV index -> 0)
+            face_verts = []
+            face_uvs = []
+            for corner in parts[1:]:
+                indices = corner.split('/')
+                face_verts.append(int(indices[0]) - 1)
+                face_uvs.append(int(indices[1]) - 1 if len(indices) >= 2 and indices[1] else 0)
+
+            # Handle triangles and quads
+            # Reverse winding order (swap v1/v2) for correct backface culling on PS1
+            # Each face is stored as its packed row: v0-v3, uv0-uv3, normal index
+            if len(face_verts) == 3:
+                faces.append((face_verts[0], face_verts[2], face_verts[1], -1,
+                              face_uvs[0], face_uvs[2], face_uvs[1], -1, 0))
+            elif len(face_verts) == 4:
+                # Split quad into two triangles (with reversed winding)
+                faces.append((face_verts[0], face_verts[2], face_verts[1], -1,
+                              face_uvs[0], face_uvs[2], face_uvs[1], -1, 0))
+                faces.append((face_verts[0], face_verts[3], face_verts[2], -1,
+                              face_uvs[0], face_uvs[3], face_uvs[2], -1, 0))
+            elif len(face_verts) > 4:
+                # Triangulate polygon using fan method (with reversed winding)
+                for i in range(1, len(face_verts) - 1):
+                    faces.append((face_verts[0], face_verts[i+1], face_verts[i], -1,
+                                  face_uvs[0], face_uvs[i+1], face_uvs[i], -1, 0))
 
     return vertices, uvs, faces
 
 
+def align4(size):
+    """Round size up to the next multiple of 4."""
+    return size + (-size & 3)
+
+
 def convert_to_binary(vertices, uvs, faces, scale=28.0, tex_size=64):
     """Convert parsed OBJ data to binary format."""
-    data = bytearray()
+    # Block offsets are known up front; UVs and faces each start 4-byte aligned
+    # and the zero-filled buffer already contains the alignment padding
+    vertex_offset = HEADER_STRUCT.size
+    uv_offset = vertex_offset + len(vertices) * VERTEX_STRUCT.size
+    face_offset = align4(uv_offset + len(uvs) * UV_STRUCT.size)
+    total_size = align4(face_offset + len(faces) * FACE_STRUCT.size)
+    data = bytearray(total_size)
 
     # Header
-    data.extend(struct.pack('<HHHH',
+    HEADER_STRUCT.pack_into(data, 0,
         len(vertices),
         len(uvs),
         len(faces),
         0  # reserved
-    ))
+    )
 
     # Vertices (scaled and converted to int16)
-    # GTEVector16 is 8 bytes: x, y, z, padding (each int16)
+    # Swap Y and Z for PS1 coordinate system, negate Y (PS1 Y is up, Z is depth)
+    # and clamp to int16 range
+    offset = vertex_offset
+    pack_into = VERTEX_STRUCT.pack_into
     for x, y, z in vertices:
-        # Scale and convert to 16-bit integers
-        # Swap Y and Z for PS1 coordinate system, negate Y
-        vx = int(x * scale)
-        vy = int(-z * scale)  # PS1 Y is up
-        vz = int(y * scale)   # PS1 Z is depth
-
-        # Clamp to int16 range
-        vx = max(-32768, min(32767, vx))
-        vy = max(-32768, min(32767, vy))
-        vz = max(-32768, min(32767, vz))
-
-        # Pack as 8 bytes: x, y, z, padding (matching GTEVector16 structure)
-        data.extend(struct.pack('<hhhh', vx, vy, vz, 0))
+        pack_into(data, offset,
+            max(-32768, min(32767, int(x * scale))),
+            max(-32768, min(32767, int(-z * scale))),
+            max(-32768, min(32767, int(y * scale))),
+            0)
+        offset += VERTEX_STRUCT.size
 
     # UVs (converted to 0-255 range based on texture size)
+    # OBJ UVs are 0-1, convert to pixel coordinates
+    # V is flipped in OBJ (0 = bottom, 1 = top)
+    offset = uv_offset
+    pack_into = UV_STRUCT.pack_into
     for u, v in uvs:
-        # OBJ UVs are 0-1, convert to pixel coordinates
-        # V is flipped in OBJ (0 = bottom, 1 = top)
-        pu = int(u * tex_size) % 256
-        pv = int((1.0 - v) * tex_size) % 256
+        pack_into(data, offset, int(u * tex_size) % 256, int((1.0 - v) * tex_size) % 256)
+        offset += UV_STRUCT.size
+
+    # Faces (normal index is unused and already 0 in each row)
+    offset = face_offset
+    pack_into = FACE_STRUCT.pack_into
+    for face in faces:
+        pack_into(data, offset, *face)
+        offset += FACE_STRUCT.size
 
-        data.extend(struct.pack('<BB', pu, pv))
+    return bytes(data)
 
-    # Pad to 4-byte alignment
-    while len(data) % 4 != 0:
-        data.append(0)
 
-    # Faces
-    for face in faces:
-        v0, v1, v2, v3 = face['verts']
-        uv0, uv1, uv2, uv3 = face['uvs']
+def hash_inputs(in_path, scale, tex_size):
+    """Return a BLAKE2b digest of everything that determines the output."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(Path(in_path).read_bytes())
+    h.update(Path(__file__).read_bytes())
+    h.update(f"{scale!r} {tex_size!r}".encode())
+    return h.hexdigest()
 
-        data.extend(struct.pack('<hhhh', v0, v1, v2, v3))
-        data.extend(struct.pack('<hhhh', uv0, uv1, uv2, uv3))
-        data.extend(struct.pack('<h', 0))  # normal index (unused)
 
-    # Pad to 4-byte alignment
-    while len(data) % 4 != 0:
-        data.append(0)
+def convert_file(in_path, out_path, scale=28.0, tex_size=64):
+    """Convert a single OBJ file and write the binary model to out_path.
 
-    return bytes(data)
+    The input hash is stored next to the output as <out_path>.hash; when it
+    matches, the conversion is skipped and the output is only touched so
+    make-style build tools still see it as fresh.
+    """
+    out_path = Path(out_path)
+    hash_path = out_path.with_name(out_path.name + '.hash')
+    input_hash = hash_inputs(in_path, scale, tex_size)
+    if out_path.exists() and hash_path.exists() and hash_path.read_text() == input_hash:
+        out_path.touch()
+        print(f"{out_path} is up to date", flush=True)
+        return
+
+    vertices, uvs, faces = parse_obj(in_path)
+    binary_data = convert_to_binary(vertices, uvs, faces, scale, tex_size)
+
+    # Ensure output directory exists
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out_path, 'wb') as f:
+        f.write(binary_data)
+    hash_path.write_text(input_hash)
+
+    # Report in one write so parallel conversions don't interleave lines
+    print(f"Converting {in_path} to {out_path}\n"
+          f"  Vertices: {len(vertices)}\n"
+          f"  UVs: {len(uvs)}\n"
+          f"  Faces: {len(faces)}\n"
+          f"  Output size: {len(binary_data)} bytes", flush=True)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Convert OBJ to PS1 binary format')
-    parser.add_argument('input', help='Input OBJ file')
-    parser.add_argument('output', help='Output binary file')
+    parser.add_argument('input', help='Input OBJ file, or a directory of OBJ files')
+    parser.add_argument('output', help='Output binary file, or a directory when input is one')
     parser.add_argument('-s', '--scale', type=float, default=28.0,
                         help='Scale factor for vertices (default: 28.0)')
     parser.add_argument('-t', '--texsize', type=int, default=64,
@@ -173,21 +205,23 @@ def main():
 
     args = parser.parse_args()
 
-    print(f"Converting {args.input} to {args.output}")
-
-    vertices, uvs, faces = parse_obj(args.input)
-    print(f"  Vertices: {len(vertices)}")
-    print(f"  UVs: {len(uvs)}")
-    print(f"  Faces: {len(faces)}")
-
-    binary_data = convert_to_binary(vertices, uvs, faces, args.scale, args.texsize)
-    print(f"  Output size: {len(binary_data)} bytes")
-
-    # Ensure output directory exists
-    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
-
-    with open(args.output, 'wb') as f:
-        f.write(binary_data)
+    input_path = Path(args.input)
+    if input_path.is_dir():
+        # Imported here so the single-file path used by CMake doesn't pay for it
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Batch mode: every *.obj becomes <name>.bin, converted across all cores
+        inputs = sorted(input_path.glob('*.obj'))
+        if not inputs:
+            print(f"No .obj files found in {input_path}")
+            sys.exit(1)
+        outputs = [Path(args.output) / (p.stem + '.bin') for p in inputs]
+
+        with ProcessPoolExecutor() as executor:
+            list(executor.map(convert_file, inputs, outputs,
+                              repeat(args.scale), repeat(args.texsize)))
+    else:
+        convert_file(args.input, args.output, args.scale, args.texsize)
 
     print("Done!")
 